@@ -1,21 +1,79 @@
+import hashlib
 import json
 import os
 from typing import Dict, List, Optional, Any
-from collections import defaultdict, deque
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from astrbot.api import logger
+import shutil
 import threading
 import time
 from datetime import datetime
 
+# 优先使用orjson（C实现，序列化更快），不可用时回退到标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """序列化JSON不支持的类型，用户上下文中的deque按列表输出"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dumps(obj: Any, pretty: bool = True) -> bytes:
+    """将对象序列化为UTF-8编码的JSON字节串，pretty为False时输出单行紧凑格式"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        return json.dumps(obj, default=_default, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    """从JSON字节串反序列化对象"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
 
 class DataStorage:
-    """数据持久化存储类，用于保存用户上下文、密钥失败计数等信息"""
+    """数据持久化存储类，用于保存用户上下文、密钥失败计数等信息
+
+    各数据分区直接引用插件传入的字典（上下文保持为deque），只在序列化时转换格式。
+    每次修改只向操作日志(ops.jsonl)追加增量记录，完整快照(plugin_data.json)
+    仅在自动保存、日志过大或显式保存时写入，写入快照后清空操作日志。
+    快照统一由单线程的写入线程池完成，尚未执行的保存请求会合并为一次写入。
+    """
+
+    # 操作日志超过该大小时触发一次快照合并
+    JOURNAL_COMPACT_SIZE = 1024 * 1024
+    # 两次快照写入之间的最小间隔（秒）
+    SAVE_DEBOUNCE = 0.5
     
     def __init__(self, plugin_name: str = "astrbot_plugin_dzmm"):
         self.plugin_name = plugin_name
         self.data_dir = os.path.join("data", "plugins", plugin_name)
         self.data_file = os.path.join(self.data_dir, "plugin_data.json")
+        self.journal_file = os.path.join(self.data_dir, "ops.jsonl")
+        # 保护操作日志的追加与清空
         self.lock = threading.Lock()
+        # 自上次快照以来数据是否有修改
+        self._dirty = False
+        self._last_save_mono = 0.0
+        # 是否已有尚未执行的异步保存
+        self._save_pending = False
+        # 最近一次写入的快照与最近一次备份的内容哈希（不含保存时间）
+        self._last_payload_hash: Optional[bytes] = None
+        self._last_backup_hash: Optional[bytes] = None
+        # 通知后台线程退出
+        self._stop = threading.Event()
         
         # 确保数据目录存在
         os.makedirs(self.data_dir, exist_ok=True)
@@ -31,9 +89,28 @@ class DataStorage:
             "version": "1.0.1"
         }
         
-        # 加载已保存的数据
+        # 打开操作日志（追加模式，不缓冲）
+        self.journal = open(self.journal_file, "ab", buffering=0)
+        self._journal_size = self.journal.tell()
+        
+        # 加载已保存的数据并重放操作日志
         self.load_data()
         
+        # 统计信息缓存，在数据修改时增量更新
+        self._context_sizes: Dict[str, int] = {}
+        self._total_messages = 0
+        self._failed_keys = set()
+        self._refresh_stats("user_contexts")
+        self._refresh_stats("api_key_failures")
+        
+        # 将重放的操作日志合并为新快照
+        if self._journal_size > 0:
+            self._dirty = True
+            self.save_data()
+        
+        # 单线程写入线程池，所有快照都在该线程中写入
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dzmm-io")
+        
         # 启动自动保存线程
         self._start_auto_save()
     
@@ -41,8 +118,8 @@ class DataStorage:
         """从文件加载数据"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    loaded_data = json.load(f)
+                with open(self.data_file, 'rb') as f:
+                    loaded_data = _loads(f.read())
                     
                 # 合并加载的数据，保持默认结构
                 for key in self.data.keys():
@@ -50,210 +127,398 @@ class DataStorage:
                         self.data[key] = loaded_data[key]
                         
                 logger.info(f"DZMM插件: 成功加载数据文件，包含 {len(self.data['user_contexts'])} 个用户上下文")
-                return True
+                loaded = True
             else:
                 logger.info("DZMM插件: 数据文件不存在，使用默认数据结构")
-                return False
+                loaded = False
                 
         except Exception as e:
             logger.error(f"DZMM插件: 加载数据文件失败: {str(e)}")
-            return False
+            loaded = False
+        
+        return self._replay_journal() > 0 or loaded
+    
+    def _replay_journal(self) -> int:
+        """重放操作日志，恢复上次快照之后的修改"""
+        replayed = 0
+        try:
+            if not os.path.exists(self.journal_file):
+                return 0
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply_op(_loads(line))
+                        replayed += 1
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        # 忽略写入中断造成的残缺记录
+                        logger.warning("DZMM插件: 跳过无法解析的操作日志记录")
+        except Exception as e:
+            logger.error(f"DZMM插件: 重放操作日志失败: {str(e)}")
+        
+        if replayed:
+            logger.info(f"DZMM插件: 已从操作日志恢复 {replayed} 条修改记录")
+        return replayed
+    
+    def _apply_op(self, op: Dict[str, Any]):
+        """将一条操作日志记录应用到内存数据"""
+        section = op["s"]
+        if section not in self.data:
+            return
+        kind = op["op"]
+        if kind == "set":
+            self.data[section][op["k"]] = op["v"]
+        elif kind == "del":
+            self.data[section].pop(op["k"], None)
+        elif kind == "reset":
+            self.data[section] = op["v"]
+    
+    def _append_ops(self, ops: List[Dict[str, Any]]):
+        """向操作日志追加修改记录，日志过大时触发快照合并"""
+        if not ops:
+            return
+        payload = b"".join(_dumps(op, pretty=False) + b"\n" for op in ops)
+        try:
+            with self.lock:
+                self.journal.write(payload)
+                self._journal_size += len(payload)
+                self._dirty = True
+                need_compact = self._journal_size >= self.JOURNAL_COMPACT_SIZE
+        except Exception as e:
+            logger.error(f"DZMM插件: 写入操作日志失败: {str(e)}")
+            return
+        
+        if need_compact:
+            self._async_save()
+    
+    def _update_section(self, section: str, data: Dict[str, Any], key: Optional[str] = None):
+        """引用新的分区数据并写入操作日志
+
+        指定key时只记录该键的修改，否则记录整个分区。
+        """
+        self.data[section] = data
+        self._refresh_stats(section, key)
+        
+        if key is None:
+            op = {"op": "reset", "s": section, "v": data}
+        elif key in data:
+            op = {"op": "set", "s": section, "k": key, "v": data[key]}
+        else:
+            op = {"op": "del", "s": section, "k": key}
+        self._append_ops([op])
+
+    def _set_one(self, section: str, key: str, value: Any):
+        """只写入分区中的单个键，不涉及分区内其他数据"""
+        self.data[section][key] = value
+        self._refresh_stats(section, key)
+        self._append_ops([{"op": "set", "s": section, "k": key, "v": value}])
+    
+    def _refresh_stats(self, section: str, key: Optional[str] = None):
+        """更新统计信息缓存，指定key时只更新该键"""
+        if section == "user_contexts":
+            contexts = self.data["user_contexts"]
+            if key is None:
+                # 遍历快照，调用方可能在其他线程中同时修改字典
+                self._context_sizes = {k: len(v) for k, v in list(contexts.items()) if v}
+                self._total_messages = sum(self._context_sizes.values())
+                return
+            size = len(contexts.get(key, ()))
+            self._total_messages += size - self._context_sizes.pop(key, 0)
+            if size:
+                self._context_sizes[key] = size
+        elif section == "api_key_failures":
+            failures = self.data["api_key_failures"]
+            if key is None:
+                self._failed_keys = {k for k, v in list(failures.items()) if v > 0}
+            elif failures.get(key, 0) > 0:
+                self._failed_keys.add(key)
+            else:
+                self._failed_keys.discard(key)
     
     def save_data(self) -> bool:
-        """保存数据到文件"""
+        """保存数据到文件
+
+        初始化完成后只应由后台写入线程调用，其他线程请使用 _async_save 或 _save_and_wait。
+        """
+        with self.lock:
+            if not self._dirty:
+                return True
+            # 先清除标记，写入期间发生的修改会重新置位
+            self._dirty = False
+            journal_mark = self._journal_size
+        
         try:
+            # 更新保存时间
+            self.data["last_save_time"] = datetime.now().isoformat()
+            
+            # 创建临时文件，避免写入过程中数据损坏
+            temp_file = self.data_file + ".tmp"
+            with open(temp_file, 'wb') as f:
+                payload_hash = self._write_snapshot(f)
+                f.flush()
+                os.fsync(f.fileno())
+            
+            # 原子性替换文件（目标不存在时同样适用）
+            os.replace(temp_file, self.data_file)
+            self._fsync_dir()
+            self._last_payload_hash = payload_hash
+            
+            # 快照已包含之前的全部修改；若写入期间有新记录则保留日志，重放结果不变
             with self.lock:
-                # 更新保存时间
-                self.data["last_save_time"] = datetime.now().isoformat()
+                if self._journal_size == journal_mark and not self.journal.closed:
+                    self.journal.truncate(0)
+                    self._journal_size = 0
                 
-                # 创建临时文件，避免写入过程中数据损坏
-                temp_file = self.data_file + ".tmp"
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.data, f, ensure_ascii=False, indent=2)
-                
-                # 原子性替换文件
-                if os.path.exists(self.data_file):
-                    os.replace(temp_file, self.data_file)
-                else:
-                    os.rename(temp_file, self.data_file)
-                    
-                logger.debug("DZMM插件: 数据已保存到文件")
-                return True
+            self._last_save_mono = time.monotonic()
+            logger.debug("DZMM插件: 数据已保存到文件")
+            return True
                 
         except Exception as e:
+            self._dirty = True
             logger.error(f"DZMM插件: 保存数据文件失败: {str(e)}")
             return False
     
-    def _async_save(self):
-        """异步保存数据到文件"""
-        def save_worker():
-            self.save_data()
+    def _write_snapshot(self, f) -> bytes:
+        """将数据以紧凑JSON格式写入文件，返回内容的SHA-256摘要
+
+        用户上下文逐个用户序列化并写入，内存峰值只取决于单个用户的数据量。
+        摘要不包含保存时间，数据未变化时摘要相同。
+        """
+        digest = hashlib.sha256()
+        
+        def write(chunk: bytes, hashed: bool = True):
+            if hashed:
+                digest.update(chunk)
+            f.write(chunk)
+        
+        write(b"{")
+        for index, (section, value) in enumerate(list(self.data.items())):
+            if index:
+                write(b",")
+            write(_dumps(section, pretty=False) + b":")
+            if section != "user_contexts":
+                write(_dumps(value, pretty=False), hashed=section != "last_save_time")
+                continue
+            
+            write(b"{")
+            for user_index, (user_key, messages) in enumerate(list(value.items())):
+                if user_index:
+                    write(b",")
+                write(_dumps(user_key, pretty=False) + b":" + _dumps(messages, pretty=False))
+            write(b"}")
+        write(b"}")
+        return digest.digest()
+    
+    def export_pretty(self, file_path: Optional[str] = None) -> bool:
+        """导出带缩进的数据文件，便于人工查看和调试"""
+        if file_path is None:
+            file_path = os.path.join(self.data_dir, "plugin_data.pretty.json")
+        try:
+            with open(file_path, 'wb') as f:
+                f.write(_dumps(self.data))
+            logger.info(f"DZMM插件: 数据已导出到: {file_path}")
+            return True
+        except Exception as e:
+            logger.error(f"DZMM插件: 导出数据失败: {str(e)}")
+            return False
+    
+    def _fsync_dir(self):
+        """同步数据目录，确保重命名操作落盘（Windows不支持打开目录，直接跳过）"""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        dir_fd = os.open(self.data_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    
+    def _run_async_save(self):
+        """在写入线程中执行合并后的异步保存"""
+        self._save_pending = False
+        
+        # 距离上次写入过近时稍作等待，让更多修改合并到同一次快照
+        delay = self._last_save_mono + self.SAVE_DEBOUNCE - time.monotonic()
+        if delay > 0 and not self._stop.is_set():
+            time.sleep(delay)
         
-        save_thread = threading.Thread(target=save_worker, daemon=True)
-        save_thread.start()
+        self.save_data()
+    
+    def _async_save(self):
+        """异步保存数据到文件，已有待执行的保存时直接合并"""
+        if self._save_pending or self._stop.is_set():
+            return
+        self._save_pending = True
+        try:
+            self._io.submit(self._run_async_save)
+        except RuntimeError:
+            # 线程池已关闭
+            self._save_pending = False
+    
+    def _save_and_wait(self, timeout: float = 30) -> bool:
+        """提交保存请求并等待写入完成"""
+        if self._stop.is_set():
+            # 写入线程池已关闭，直接在当前线程保存
+            return self.save_data()
+        try:
+            return self._io.submit(self.save_data).result(timeout)
+        except FutureTimeoutError:
+            logger.warning("DZMM插件: 等待数据保存超时")
+            return False
     
     def save_all_data(self, user_contexts, user_current_persona, user_current_api_key, api_key_failures, user_last_activity=None):
         """保存所有数据"""
-        # 将deque转换为list进行JSON序列化
-        contexts_data = {}
-        for user_key, messages in user_contexts.items():
-            contexts_data[user_key] = list(messages)
-        
-        self.data["user_contexts"] = contexts_data
-        self.data["user_current_persona"] = dict(user_current_persona)
-        self.data["user_current_api_key"] = dict(user_current_api_key)
-        self.data["api_key_failures"] = dict(api_key_failures)
+        self.data["user_contexts"] = user_contexts
+        self.data["user_current_persona"] = user_current_persona
+        self.data["user_current_api_key"] = user_current_api_key
+        self.data["api_key_failures"] = api_key_failures
         if user_last_activity is not None:
-            self.data["user_last_activity"] = dict(user_last_activity)
+            self.data["user_last_activity"] = user_last_activity
+        # 先标记待保存，统计刷新出错时最终保存也不会被跳过
+        with self.lock:
+            self._dirty = True
+        self._refresh_stats("user_contexts")
+        self._refresh_stats("api_key_failures")
         
         # 立即保存到文件
-        self.save_data()
+        self._save_and_wait()
     
     def get_user_contexts(self, context_length: int) -> Dict[str, deque]:
         """获取用户上下文，转换为deque格式"""
-        contexts = defaultdict(lambda: deque(maxlen=context_length))
+        # maxlen会自动丢弃较旧的消息，只保留最新的context_length条
+        contexts = {
+            user_key: deque(messages, maxlen=context_length)
+            for user_key, messages in self.data["user_contexts"].items()
+        }
         
-        for user_key, messages in self.data["user_contexts"].items():
-            # 创建新的deque并添加消息
-            user_deque = deque(maxlen=context_length)
-            for msg in messages[-context_length:]:  # 只取最新的消息
-                user_deque.append(msg)
-            contexts[user_key] = user_deque
-            
+        self.data["user_contexts"] = contexts
+        self._refresh_stats("user_contexts")
         return contexts
     
-    def save_user_contexts(self, user_contexts: Dict[str, deque]):
-        """保存用户上下文"""
-        # 将deque转换为list进行JSON序列化
-        contexts_data = {}
-        for user_key, messages in user_contexts.items():
-            contexts_data[user_key] = list(messages)
-        
-        self.data["user_contexts"] = contexts_data
-        # 立即异步保存到文件
-        self._async_save()
+    def save_user_contexts(self, user_contexts: Dict[str, deque], user_key: Optional[str] = None):
+        """保存用户上下文，指定user_key时只记录该用户的修改"""
+        self._update_section("user_contexts", user_contexts, user_key)
+    
+    def save_user_context_one(self, user_key: str, messages: deque):
+        """只保存单个用户的上下文"""
+        self._set_one("user_contexts", user_key, messages)
     
     def get_user_current_persona(self) -> Dict[str, str]:
         """获取用户当前角色"""
-        return defaultdict(lambda: "default", self.data["user_current_persona"])
+        return self.data["user_current_persona"]
     
-    def save_user_current_persona(self, user_current_persona: Dict[str, str]):
-        """保存用户当前角色"""
-        self.data["user_current_persona"] = dict(user_current_persona)
-        # 立即异步保存到文件
-        self._async_save()
+    def save_user_current_persona(self, user_current_persona: Dict[str, str], user_key: Optional[str] = None):
+        """保存用户当前角色，指定user_key时只记录该用户的修改"""
+        self._update_section("user_current_persona", user_current_persona, user_key)
     
     def get_user_current_api_key(self) -> Dict[str, str]:
         """获取用户当前API密钥"""
-        return defaultdict(lambda: "default", self.data["user_current_api_key"])
+        return self.data["user_current_api_key"]
     
-    def save_user_current_api_key(self, user_current_api_key: Dict[str, str]):
-        """保存用户当前API密钥"""
-        self.data["user_current_api_key"] = dict(user_current_api_key)
-        # 立即异步保存到文件
-        self._async_save()
+    def save_user_current_api_key(self, user_current_api_key: Dict[str, str], user_key: Optional[str] = None):
+        """保存用户当前API密钥，指定user_key时只记录该用户的修改"""
+        self._update_section("user_current_api_key", user_current_api_key, user_key)
     
     def get_api_key_failures(self) -> Dict[str, int]:
         """获取API密钥失败计数"""
-        return defaultdict(int, self.data["api_key_failures"])
+        return self.data["api_key_failures"]
+    
+    def save_api_key_failures(self, api_key_failures: Dict[str, int], key_name: Optional[str] = None):
+        """保存API密钥失败计数，指定key_name时只记录该密钥的修改"""
+        self._update_section("api_key_failures", api_key_failures, key_name)
     
-    def save_api_key_failures(self, api_key_failures: Dict[str, int]):
-        """保存API密钥失败计数"""
-        self.data["api_key_failures"] = dict(api_key_failures)
-        # 立即异步保存到文件
-        self._async_save()
+    def save_api_key_failure_one(self, key_name: str, count: int):
+        """只保存单个API密钥的失败计数"""
+        self._set_one("api_key_failures", key_name, count)
     
     def clear_api_key_failures(self):
         """清除所有API密钥失败计数"""
-        self.data["api_key_failures"] = {}
-        # 立即异步保存到文件
-        self._async_save()
+        self.data["api_key_failures"].clear()
+        self._failed_keys.clear()
+        self._append_ops([{"op": "reset", "s": "api_key_failures", "v": {}}])
 
-    def get_user_last_activity(self) -> Dict[str, float]:
-        """获取用户最后活动时间
-        
-        Returns:
-            用户最后活动时间字典
-        """
-        try:
-            if os.path.exists(self.user_last_activity_file):
-                with open(self.user_last_activity_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                logging.info(f"DZMM插件: 已恢复用户活动时间数据")
-                return data
-        except Exception as e:
-            logging.error(f"DZMM插件: 读取用户活动时间数据失败: {str(e)}")
-        
-        # 如果读取失败或文件不存在，返回空字典
-        return {}
-    
-    def save_user_last_activity(self, user_last_activity: Dict[str, float]):
-        """保存用户最后活动时间
-        
-        Args:
-            user_last_activity: 用户最后活动时间字典
-        """
-        try:
-            with open(self.user_last_activity_file, 'w', encoding='utf-8') as f:
-                json.dump(user_last_activity, f, ensure_ascii=False, indent=2)
-            
-            logging.debug(f"DZMM插件: 用户活动时间数据已保存")
-        except Exception as e:
-            logging.error(f"DZMM插件: 保存用户活动时间数据失败: {str(e)}")
-    
     def get_user_last_activity(self) -> Dict[str, str]:
         """获取用户最后活动时间"""
         return dict(self.data.get("user_last_activity", {}))
     
-    def save_user_last_activity(self, user_last_activity: Dict[str, str]):
-        """保存用户最后活动时间"""
-        self.data["user_last_activity"] = dict(user_last_activity)
-        # 立即异步保存到文件
-        self._async_save()
+    def save_user_last_activity(self, user_last_activity: Dict[str, str], user_key: Optional[str] = None):
+        """保存用户最后活动时间，指定user_key时只记录该用户的修改"""
+        self._update_section("user_last_activity", user_last_activity, user_key)
     
     def clear_user_context(self, user_key: str):
         """清除指定用户的上下文"""
         if user_key in self.data["user_contexts"]:
             del self.data["user_contexts"][user_key]
-            # 立即异步保存到文件
-            self._async_save()
+            self._refresh_stats("user_contexts", user_key)
+            self._append_ops([{"op": "del", "s": "user_contexts", "k": user_key}])
     
     def clear_all_contexts(self):
         """清除所有用户上下文"""
-        self.data["user_contexts"] = {}
-        # 立即异步保存到文件
-        self._async_save()
+        self.data["user_contexts"].clear()
+        self._refresh_stats("user_contexts")
+        self._append_ops([{"op": "reset", "s": "user_contexts", "v": {}}])
     
     def get_storage_stats(self) -> Dict[str, Any]:
         """获取存储统计信息"""
         return {
             "total_users": len(self.data["user_contexts"]),
-            "total_messages": sum(len(msgs) for msgs in self.data["user_contexts"].values()),
-            "failed_keys": len([k for k, v in self.data["api_key_failures"].items() if v > 0]),
+            "total_messages": self._total_messages,
+            "failed_keys": len(self._failed_keys),
             "last_save_time": self.data["last_save_time"],
-            "data_file_size": os.path.getsize(self.data_file) if os.path.exists(self.data_file) else 0,
+            "data_file_size": self._data_file_size(),
             "version": self.data["version"]
         }
     
+    def _data_file_size(self) -> int:
+        """获取数据文件大小，文件不存在时返回0"""
+        try:
+            return os.path.getsize(self.data_file)
+        except OSError:
+            return 0
+    
     def _start_auto_save(self):
         """启动自动保存线程"""
         def auto_save_worker():
-            while True:
-                time.sleep(300)  # 每5分钟自动保存一次
-                self.save_data()
+            # 每5分钟自动保存一次，收到停止信号时立即退出
+            while not self._stop.wait(300):
+                # 有修改时交给写入线程写入完整快照并清空操作日志
+                if self._dirty:
+                    self._async_save()
         
-        auto_save_thread = threading.Thread(target=auto_save_worker, daemon=True)
-        auto_save_thread.start()
+        self._auto_save_thread = threading.Thread(target=auto_save_worker, daemon=True)
+        self._auto_save_thread.start()
         logger.info("DZMM插件: 自动保存线程已启动，每5分钟保存一次数据")
     
+    def close(self, timeout: float = 30):
+        """停止后台线程，写入最终快照并关闭操作日志"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        
+        # 等待已提交的保存完成后写入最终快照
+        self._io.shutdown(wait=True)
+        self.save_data()
+        self._auto_save_thread.join(timeout)
+        
+        with self.lock:
+            self.journal.close()
+        logger.info("DZMM插件: 数据存储已关闭")
+    
     def backup_data(self) -> bool:
         """创建数据备份"""
         try:
             if os.path.exists(self.data_file):
+                # 数据文件内容与上次备份相同时无需重复备份
+                payload_hash = self._last_payload_hash
+                if payload_hash is not None and payload_hash == self._last_backup_hash:
+                    logger.debug("DZMM插件: 数据自上次备份以来未变化，跳过备份")
+                    return True
+                
                 backup_file = f"{self.data_file}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                import shutil
-                shutil.copy2(self.data_file, backup_file)
+                # 只需复制数据内容，不复制文件元数据
+                shutil.copyfile(self.data_file, backup_file)
+                self._last_backup_hash = payload_hash
                 logger.info(f"DZMM插件: 数据备份已创建: {backup_file}")
                 return True
             return False
@@ -264,17 +529,15 @@ class DataStorage:
     def cleanup_old_backups(self, keep_count: int = 5):
         """清理旧的备份文件，只保留最新的几个"""
         try:
-            backup_files = []
-            for file in os.listdir(self.data_dir):
-                if file.startswith("plugin_data.json.backup."):
-                    backup_files.append(os.path.join(self.data_dir, file))
+            with os.scandir(self.data_dir) as entries:
+                backup_files = [entry for entry in entries if entry.name.startswith("plugin_data.json.backup.")]
             
             # 按修改时间排序，保留最新的几个
-            backup_files.sort(key=os.path.getmtime, reverse=True)
+            backup_files.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
             
             for old_backup in backup_files[keep_count:]:
-                os.remove(old_backup)
-                logger.debug(f"DZMM插件: 已删除旧备份文件: {old_backup}")
+                os.remove(old_backup.path)
+                logger.debug(f"DZMM插件: 已删除旧备份文件: {old_backup.path}")
                 
         except Exception as e:
             logger.error(f"DZMM插件: 清理备份文件失败: {str(e)}")
@@ -17,13 +17,17 @@ except ImportError:
                 return func
             return decorator
 from typing import Dict, List, Optional
-from collections import defaultdict, deque
+from collections import deque
 import asyncio
-import concurrent.futures
-import schedule
+import functools
+import json
+import queue
+import re
 import threading
 import time
-from datetime import datetime
+import traceback
+import aiohttp
+from datetime import datetime, timedelta
 
 # 导入会话控制相关模块
 import astrbot.api.message_components as Comp
@@ -35,6 +39,25 @@ from astrbot.core.utils.session_waiter import (
 # 导入数据存储模块
 from .data_storage import DataStorage
 
+# SSE数据帧解析优先使用orjson，不可用时回退到标准库json
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+# API返回错误信息中表示密钥额度或限制问题的关键词
+_KEY_ERROR_RE = re.compile(r"quota|limit|exceeded|insufficient|balance|credit", re.IGNORECASE)
+# 错误信息同时包含invalid和key时视为密钥无效
+_INVALID_KEY_RE = re.compile(r"(?=.*invalid)(?=.*key)", re.IGNORECASE | re.DOTALL)
+# 网络请求错误中表示密钥问题的状态码或关键词
+_NET_KEY_ERROR_RE = re.compile(r"401|403|429|unauthorized|forbidden", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _fmt_ts(ts: int) -> str:
+    """将秒级时间戳格式化为本地时间字符串，结果按秒缓存"""
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
 
 @register(
     "astrbot_plugin_dzmm",
@@ -44,10 +67,41 @@ from .data_storage import DataStorage
     "https://github.com/VincenttHo/astrbot_plugin_dzmm",
 )
 class PluginDzmm(Star):
+    # 状态回复模板
+    _STATUS_TPL = (
+        "当前状态：\n"
+        "• 聊天模式：{mode}\n"
+        "• 当前用户：{nick}\n"
+        "• 昵称显示：{nick_status}\n"
+        "• 使用角色：{persona}\n"
+        "• 使用API密钥：{key}\n"
+        "• 上下文消息数：{count}/{length}"
+    )
+    _TRIGGER_TPL = (
+        "定时触发功能状态：\n"
+        "• 功能状态：✅ 已启用\n"
+        "• 触发间隔：{interval}分钟\n"
+        "• 白名单状态：{whitelist}\n"
+        "• 最后活动时间：{last_activity}\n"
+        "• 下次触发时间：{next_minutes:.1f}分钟后\n"
+        "• 触发消息：{message}\n\n"
+        "💡 只有私聊且在白名单中的用户才会收到定时触发消息"
+    )
+
     def __init__(self, context: Context, config: dict):
         super().__init__(context)
         self.config = config
 
+        # 生命周期相关属性先设为默认值，初始化中途失败时terminate也能正常执行
+        self.enable_memory = False
+        self.data_storage = None
+        self.auto_trigger_task = None
+        self._reset_task = None
+        self._flush_task = None
+        self._writer_thread = None
+        # 共享的HTTP会话，首次请求时创建，复用TCP/TLS连接
+        self._session: Optional[aiohttp.ClientSession] = None
+
         # 基础配置参数
         self.context_length = self.config.get("context_length", 10)
         self.api_url = self.config.get("api_url", "https://www.gpt4novel.com/api/xiaoshuoai/ext/v1/chat/completions")
@@ -61,15 +115,26 @@ class PluginDzmm(Star):
         self.show_nickname = self.config.get("show_nickname", True)
         self.group_shared_context = self.config.get("group_shared_context", True)
         self.enable_memory = self.config.get("enable_memory", True)
+
+        # 状态显示用的文本，按（私聊, 群聊）和昵称显示开关预先确定
+        self._mode_strs = ("私聊模式", "群聊模式（共享上下文）" if self.group_shared_context else "群聊模式（独立上下文）")
+        self._nick_strs = ("禁用", "启用")
         
         # 定时触发配置
         self.enable_auto_trigger = self.config.get("enable_auto_trigger", False)
         self.auto_trigger_interval = max(1, min(10080, self.config.get("auto_trigger_interval", 1440)))  # 限制在1-10080分钟之间（1小时-7天）
         self.auto_trigger_message = self.config.get("auto_trigger_message", "（注：由于我很久没跟你说话，你开始寂寞，你主动找我...）")
-        self.auto_trigger_whitelist = self._parse_list_config("auto_trigger_whitelist", [])
+        # 白名单只用于成员判断，使用frozenset使查找为O(1)
+        self.auto_trigger_whitelist = frozenset(self._parse_list_config("auto_trigger_whitelist", []))
         
         # 用户最后活动时间记录
         self.user_last_activity = {}
+        # 定时触发对象（私聊白名单用户）的下次触发时间
+        self._trigger_deadlines: Dict[str, float] = {}
+        # 触发计划变化时唤醒定时触发任务，使其重新计算休眠时间
+        self._trigger_wake = asyncio.Event()
+        # 用户是否为群聊的缓存，按user_key首次出现时计算
+        self._user_is_group: Dict[str, bool] = {}
 
         # 多角色配置
         self.personas = self._parse_json_config("personas", {
@@ -84,6 +149,9 @@ class PluginDzmm(Star):
         if old_system_prompt and "default" not in self.personas:
             self.personas["default"] = old_system_prompt
 
+        # 系统提示消息缓存，键为(角色名, 是否群聊)，角色配置只在加载时确定
+        self._system_msg_cache: Dict[tuple, dict] = {}
+
         # 多API密钥配置
         self.api_keys = self._parse_json_config("api_keys", {})
 
@@ -92,6 +160,16 @@ class PluginDzmm(Star):
         if old_api_key and "default" not in self.api_keys:
             self.api_keys["default"] = old_api_key
 
+        # 预先计算密钥名称列表及其位置，切换密钥时无需重复构建
+        self._key_names = list(self.api_keys.keys())
+        self._key_index = {name: i for i, name in enumerate(self._key_names)}
+        self._default_api_key = self.api_keys.get("default", "")
+
+        # 角色和密钥只在加载配置时确定，预先生成命令中用到的列表文本
+        self._personas_csv = ", ".join(self.personas)
+        self._personas_bullets = "\n".join(f"• {name}" for name in self.personas)
+        self._api_keys_csv = ", ".join(self.api_keys)
+
         # 根据配置决定是否启用记忆功能
         if self.enable_memory:
             # 初始化数据存储
@@ -111,30 +189,43 @@ class PluginDzmm(Star):
                     self.user_last_activity = {}
             else:
                 # 如果data_storage初始化失败，使用默认值
-                self.user_contexts = defaultdict(lambda: deque(maxlen=self.context_length))
-                self.user_current_persona = defaultdict(lambda: "default")
-                self.user_current_api_key = defaultdict(lambda: "default")
-                self.api_key_failures = defaultdict(int)
+                self.user_contexts = {}
+                self.user_current_persona = {}
+                self.user_current_api_key = {}
+                self.api_key_failures = {}
                 self.user_last_activity = {}
             
             logger.info("DZMM插件: 记忆功能已启用，数据将自动保存和恢复")
         else:
             # 不启用记忆功能，使用默认初始化
             self.data_storage = None
-            self.user_contexts = defaultdict(lambda: deque(maxlen=self.context_length))
-            self.user_current_persona = defaultdict(lambda: "default")
-            self.user_current_api_key = defaultdict(lambda: "default")
-            self.api_key_failures = defaultdict(int)
+            self.user_contexts = {}
+            self.user_current_persona = {}
+            self.user_current_api_key = {}
+            self.api_key_failures = {}
             
             logger.info("DZMM插件: 记忆功能已禁用，数据不会保存")
         
         self.max_failures_before_switch = max(1, min(10, self.config.get("max_failures_before_switch", 3)))  # 连续失败多少次后切换key，限制在1-10之间
         
-        # 初始化定时任务
-        self._init_scheduler()
+        # 待保存的用户上下文、活动时间、角色和API密钥选择，由后台任务每5秒批量写入一次
+        self._dirty_users = set()
+        self._dirty_activity = set()
+        self._dirty_persona = set()
+        self._dirty_api_key = set()
+        self._flush_event = asyncio.Event()
+        # 存储写入在独立线程中执行，避免序列化和磁盘I/O阻塞事件循环
+        self._write_queue: queue.SimpleQueue = queue.SimpleQueue()
+        if self.enable_memory and self.data_storage:
+            self._writer_thread = threading.Thread(target=self._writer_loop, name="dzmm-writer", daemon=True)
+            self._writer_thread.start()
+            self._flush_task = asyncio.create_task(self._periodic_flush())
+        
+        # 启动每日重置失败计数的定时任务
+        self._reset_task = asyncio.create_task(self._daily_reset_loop())
+        logger.info("定时任务已启动，将在每天凌晨1点重置API密钥失败计数")
         
         # 启动定时触发任务（如果启用）
-        self.auto_trigger_task = None
         if self.enable_auto_trigger:
             self.auto_trigger_task = asyncio.create_task(self._auto_trigger_task())
             logger.info(f"DZMM插件: 定时触发功能已启用，间隔时间: {self.auto_trigger_interval}分钟")
@@ -154,13 +245,12 @@ class PluginDzmm(Star):
             if stats['failed_keys'] > 0:
                 logger.info(f"DZMM插件: 恢复了 {stats['failed_keys']} 个失败的API密钥计数")
         
-        # 初始化白名单用户的最后活动时间
+        # 初始化白名单用户的最后活动时间和下次触发时间
         self._init_whitelist_activity()
+        self._init_trigger_deadlines()
 
     def _parse_json_config(self, key: str, default_value: dict) -> dict:
         """解析JSON格式的配置项"""
-        import json
-
         config_value = self.config.get(key)
         if not config_value:
             return default_value
@@ -187,8 +277,6 @@ class PluginDzmm(Star):
 
     def _parse_list_config(self, key: str, default_value: list) -> list:
         """解析列表格式的配置项，支持直接的list类型和JSON字符串格式"""
-        import json
-
         config_value = self.config.get(key)
         if not config_value:
             return default_value
@@ -218,7 +306,7 @@ class PluginDzmm(Star):
         if not self.enable_auto_trigger or not self.auto_trigger_whitelist:
             return
         
-        current_time = datetime.now().timestamp()
+        current_time = time.time()
         updated_count = 0
         
         for whitelist_entry in self.auto_trigger_whitelist:
@@ -241,7 +329,41 @@ class PluginDzmm(Star):
         else:
             logger.info("DZMM插件: 所有白名单用户的最后活动时间已存在，无需初始化")
 
+    def _is_group_user(self, user_key: str) -> bool:
+        """判断用户是否为群聊，结果按user_key缓存"""
+        is_group = self._user_is_group.get(user_key)
+        if is_group is None:
+            is_group = self._user_is_group[user_key] = "_group_" in user_key
+        return is_group
+
+    def _is_trigger_target(self, user_key: str) -> bool:
+        """判断用户是否为定时触发对象（私聊且在白名单中）"""
+        if "_private_" not in user_key:
+            return False
+        return user_key.split("_private_")[-1] in self.auto_trigger_whitelist
+
+    def _init_trigger_deadlines(self):
+        """根据最后活动时间计算白名单用户的下次触发时间"""
+        if not self.enable_auto_trigger or not self.auto_trigger_whitelist:
+            return
+
+        trigger_threshold = self.auto_trigger_interval * 60
+        for user_key, last_activity in self.user_last_activity.items():
+            if self._is_trigger_target(user_key):
+                self._trigger_deadlines[user_key] = last_activity + trigger_threshold
+
     def get_user_key(self, event: AstrMessageEvent) -> str:
+        """获取用户唯一标识，结果缓存在事件对象上"""
+        user_key = getattr(event, "_dzmm_user_key", None)
+        if user_key is None:
+            user_key = self._build_user_key(event)
+            try:
+                event._dzmm_user_key = user_key
+            except AttributeError:
+                pass
+        return user_key
+
+    def _build_user_key(self, event: AstrMessageEvent) -> str:
         """生成用户唯一标识
 
         根据配置决定群聊是否共享上下文：
@@ -261,6 +383,17 @@ class PluginDzmm(Star):
             return f"{platform}_private_{user_id}"
 
     def get_user_nickname(self, event: AstrMessageEvent) -> str:
+        """获取用户昵称，结果缓存在事件对象上"""
+        nickname = getattr(event, "_dzmm_nickname", None)
+        if nickname is None:
+            nickname = self._build_user_nickname(event)
+            try:
+                event._dzmm_nickname = nickname
+            except AttributeError:
+                pass
+        return nickname
+
+    def _build_user_nickname(self, event: AstrMessageEvent) -> str:
         """获取用户昵称"""
         # 使用astrbot官方API获取用户昵称
         try:
@@ -282,10 +415,13 @@ class PluginDzmm(Star):
 
     def add_to_context(self, user_key: str, role: str, content: str, nickname: str = None):
         """添加消息到用户上下文"""
+        # 空消息不写入上下文
+        if not content or content.isspace():
+            return
+
         if role == "user" and nickname and self.show_nickname:
             # 判断是否为群聊模式
-            is_group_chat = "_group_" in user_key
-            if is_group_chat:
+            if self._is_group_user(user_key):
                 # 群聊模式：添加昵称信息
                 formatted_content = f"[{nickname}]: {content}"
             else:
@@ -294,27 +430,103 @@ class PluginDzmm(Star):
         else:
             formatted_content = content
 
-        self.user_contexts[user_key].append({"role": role, "content": formatted_content})
+        # 只在真正写入消息时才为用户创建上下文
+        context = self.user_contexts.get(user_key)
+        if context is None:
+            context = self.user_contexts[user_key] = deque(maxlen=self.context_length)
+        # 与上一条消息完全相同时不重复写入
+        last = context[-1] if context else None
+        appended = last is None or last["role"] != role or last["content"] != formatted_content
+        if appended:
+            context.append({"role": role, "content": formatted_content})
         
-        # 更新用户最后活动时间（仅当是用户消息时）
+        # 更新用户最后活动时间和下次触发时间（仅当是用户消息时）
         if role == "user":
-            self.user_last_activity[user_key] = datetime.now().timestamp()
+            now = time.time()
+            self.user_last_activity[user_key] = now
+            if self.enable_auto_trigger and self._is_trigger_target(user_key):
+                if user_key not in self._trigger_deadlines:
+                    # 新的触发对象可能早于当前休眠的截止时间
+                    self._trigger_wake.set()
+                self._trigger_deadlines[user_key] = now + self.auto_trigger_interval * 60
         
-        # 保存用户上下文到存储（如果启用记忆功能）
+        # 标记待保存，由后台任务批量写入存储（如果启用记忆功能）
+        if appended:
+            self._mark_dirty(self._dirty_users, user_key)
+        if role == "user":
+            self._mark_dirty(self._dirty_activity, user_key)
+
+    def _mark_dirty(self, dirty: set, user_key: str):
+        """标记用户数据待保存，由批量保存任务统一写入（如果启用记忆功能）"""
         if self.enable_memory and self.data_storage:
-            self.data_storage.save_user_contexts(self.user_contexts)
-            # 保存用户最后活动时间
-            if role == "user":
-                self.data_storage.save_user_last_activity(self.user_last_activity)
+            dirty.add(user_key)
+            self._flush_event.set()
+
+    def _clear_dirty(self):
+        """丢弃所有待保存标记，用于完整保存之前"""
+        self._dirty_users.clear()
+        self._dirty_activity.clear()
+        self._dirty_persona.clear()
+        self._dirty_api_key.clear()
+
+    def _flush_dirty(self):
+        """将标记为待保存的用户数据交给写入线程"""
+        if not (self._dirty_users or self._dirty_activity or self._dirty_persona or self._dirty_api_key):
+            return
+        dirty_users, self._dirty_users = self._dirty_users, set()
+        dirty_activity, self._dirty_activity = self._dirty_activity, set()
+        dirty_persona, self._dirty_persona = self._dirty_persona, set()
+        dirty_api_key, self._dirty_api_key = self._dirty_api_key, set()
+        self._write_queue.put(functools.partial(
+            self._write_dirty, dirty_users, dirty_activity, dirty_persona, dirty_api_key
+        ))
+
+    def _write_dirty(self, dirty_users: set, dirty_activity: set, dirty_persona: set, dirty_api_key: set):
+        """在写入线程中将指定用户的数据写入存储
+
+        上下文以引用传递，序列化时deque会被整体复制为列表，不受事件循环并发追加的影响。
+        """
+        for user_key in dirty_users:
+            context = self.user_contexts.get(user_key)
+            if context is not None:
+                self.data_storage.save_user_context_one(user_key, context)
+        for user_key in dirty_activity:
+            self.data_storage.save_user_last_activity(self.user_last_activity, user_key)
+        for user_key in dirty_persona:
+            self.data_storage.save_user_current_persona(self.user_current_persona, user_key)
+        for user_key in dirty_api_key:
+            self.data_storage.save_user_current_api_key(self.user_current_api_key, user_key)
+
+    def _writer_loop(self):
+        """写入线程：依次执行队列中的写入任务，收到None时退出"""
+        while True:
+            job = self._write_queue.get()
+            if job is None:
+                break
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"DZMM插件: 写入数据时发生错误: {str(e)}")
 
-    def get_context_messages(self, user_key: str) -> List[dict]:
-        """获取用户的上下文消息"""
-        # 获取用户当前使用的角色
-        current_persona = self.user_current_persona[user_key]
-        base_prompt = self.personas.get(current_persona, self.personas.get("default", "你是一个有帮助的AI助手。"))
+    async def _periodic_flush(self):
+        """批量保存任务：有数据修改时等待5秒收集更多修改，然后统一写入"""
+        while True:
+            await self._flush_event.wait()
+            await asyncio.sleep(5.0)
+            self._flush_event.clear()
+            try:
+                self._flush_dirty()
+            except Exception as e:
+                logger.error(f"DZMM插件: 批量保存数据时发生错误: {str(e)}")
+
+    def _get_system_message(self, persona_name: str, is_group_chat: bool) -> dict:
+        """获取指定角色和聊天场景的系统提示消息，结果会被缓存"""
+        cache_key = (persona_name, is_group_chat)
+        system_msg = self._system_msg_cache.get(cache_key)
+        if system_msg is not None:
+            return system_msg
 
-        # 判断是否为群聊
-        is_group_chat = "_group_" in user_key
+        base_prompt = self.personas.get(persona_name, self.personas.get("default", "你是一个有帮助的AI助手。"))
 
         if is_group_chat:
             # 群聊模式：添加群聊相关的指导
@@ -323,72 +535,76 @@ class PluginDzmm(Star):
             # 私聊模式：使用原始提示词
             system_prompt = base_prompt
 
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(list(self.user_contexts[user_key]))
-        return messages
+        system_msg = {"role": "system", "content": system_prompt}
+        self._system_msg_cache[cache_key] = system_msg
+        return system_msg
+
+    def get_context_messages(self, user_key: str) -> List[dict]:
+        """获取用户的上下文消息"""
+        # 获取用户当前使用的角色
+        current_persona = self.user_current_persona.get(user_key, "default")
+
+        return [self._get_system_message(current_persona, self._is_group_user(user_key)), *self.user_contexts.get(user_key, ())]
 
     def get_current_api_key(self, user_key: str) -> str:
         """获取用户当前使用的API密钥"""
-        current_key_name = self.user_current_api_key[user_key]
-        return self.api_keys.get(current_key_name, self.api_keys.get("default", ""))
+        current_key_name = self.user_current_api_key.get(user_key, "default")
+        return self.api_keys.get(current_key_name, self._default_api_key)
     
     def get_next_available_key(self, user_key: str) -> Optional[str]:
         """获取下一个可用的API密钥"""
-        current_key_name = self.user_current_api_key[user_key]
-        key_names = list(self.api_keys.keys())
+        current_key_name = self.user_current_api_key.get(user_key, "default")
+        key_names = self._key_names
         
         if not key_names:
             return None
             
         # 找到当前key在列表中的位置
-        try:
-            current_index = key_names.index(current_key_name)
-        except ValueError:
-            current_index = -1
+        current_index = self._key_index.get(current_key_name, -1)
+        key_count = len(key_names)
             
         # 从下一个key开始尝试，如果到末尾则从头开始
-        for i in range(len(key_names)):
-            next_index = (current_index + 1 + i) % len(key_names)
-            next_key_name = key_names[next_index]
+        for i in range(key_count):
+            next_key_name = key_names[(current_index + 1 + i) % key_count]
             
             # 如果这个key的失败次数少于阈值，就使用它
-            if self.api_key_failures[next_key_name] < self.max_failures_before_switch:
+            if self.api_key_failures.get(next_key_name, 0) < self.max_failures_before_switch:
                 return next_key_name
                 
         # 如果所有key都失败了，重置失败计数并返回第一个key
         logger.warning("DZMM插件: 所有API密钥都已达到失败阈值，重置失败计数")
         self.api_key_failures.clear()
-        return key_names[0] if key_names else None
+        if self.enable_memory and self.data_storage:
+            self.data_storage.clear_api_key_failures()
+        return key_names[0]
     
     def switch_to_next_key(self, user_key: str) -> bool:
         """切换到下一个可用的API密钥"""
         next_key = self.get_next_available_key(user_key)
-        if next_key and next_key != self.user_current_api_key[user_key]:
-            old_key = self.user_current_api_key[user_key]
+        if next_key and next_key != self.user_current_api_key.get(user_key, "default"):
+            old_key = self.user_current_api_key.get(user_key, "default")
             self.user_current_api_key[user_key] = next_key
             logger.info(f"DZMM插件: 自动切换API密钥 {old_key} -> {next_key}")
             
-            # 保存用户当前API密钥到存储（如果启用记忆功能）
-            if self.enable_memory and self.data_storage:
-                self.data_storage.save_user_current_api_key(self.user_current_api_key)
+            # 标记用户当前API密钥待保存
+            self._mark_dirty(self._dirty_api_key, user_key)
             return True
         return False
     
-    def _init_scheduler(self):
-        """初始化定时任务"""
-        # 设置每天凌晨1点重置失败计数
-        schedule.every().day.at("01:00").do(self._reset_all_key_failures)
-        
-        # 启动定时任务线程
-        def run_scheduler():
-            while True:
-                schedule.run_pending()
-                time.sleep(60)  # 每分钟检查一次
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
-        
-        logger.info("定时任务已启动，将在每天凌晨1点重置API密钥失败计数")
+    async def _daily_reset_loop(self):
+        """每天凌晨1点重置所有API密钥的失败计数"""
+        while True:
+            # 每次都重新计算到下一个凌晨1点的时间，避免累计误差
+            now = datetime.now()
+            next_run = now.replace(hour=1, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            
+            try:
+                self._reset_all_key_failures()
+            except Exception as e:
+                logger.error(f"DZMM插件: 重置API密钥失败计数时发生错误: {str(e)}")
     
     def _reset_all_key_failures(self):
         """重置所有API密钥的失败计数"""
@@ -398,44 +614,45 @@ class PluginDzmm(Star):
         logger.info(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 已重置所有API密钥的失败计数")
     
     async def _auto_trigger_task(self):
-        """定时触发任务"""
+        """定时触发任务：休眠到最早的触发时间，然后触发到期的用户"""
         while True:
             try:
-                await self._execute_auto_trigger(False)
+                next_fire = min(self._trigger_deadlines.values(), default=None)
+                if next_fire is None:
+                    # 暂无触发对象，一个触发间隔后再检查
+                    delay = self.auto_trigger_interval * 60
+                else:
+                    delay = max(0, next_fire - time.time())
+                try:
+                    await asyncio.wait_for(self._trigger_wake.wait(), timeout=delay)
+                    # 被提前唤醒，重新计算下次触发时间
+                    self._trigger_wake.clear()
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+                await self._execute_auto_trigger()
             except Exception as e:
                 logger.error(f"DZMM插件: 定时触发任务发生错误: {str(e)}")
                 await asyncio.sleep(300)  # 出错时等待5分钟再继续
     
-    async def _execute_auto_trigger(self, is_test):
-        """执行定时触发"""
-        trigger_threshold = self.auto_trigger_interval * 60  # 转换为秒（分钟*60）
-
-        if not is_test:
-            await asyncio.sleep(trigger_threshold - 10)
-        
+    async def _execute_auto_trigger(self):
+        """执行定时触发，向所有已到触发时间的白名单用户发送消息"""
         if not self.enable_auto_trigger:
             return
         
-        current_time = datetime.now().timestamp()
+        trigger_threshold = self.auto_trigger_interval * 60  # 转换为秒（分钟*60）
+        current_time = time.time()
         
-        # 检查每个用户的最后活动时间
-        for user_key, last_activity in list(self.user_last_activity.items()):
-            # 只处理私聊用户
-            if "_private_" not in user_key:
-                continue
-            
-            # 提取用户ID进行白名单检查
-            user_id = user_key.split("_private_")[-1]
-            if not self.auto_trigger_whitelist or user_id not in self.auto_trigger_whitelist:
+        # 只检查白名单中的私聊用户
+        for user_key, deadline in list(self._trigger_deadlines.items()):
+            if deadline > current_time:
                 continue
             
-            # 检查是否超过触发间隔
-            if current_time - last_activity >= trigger_threshold:
-                await self._send_auto_trigger_message(user_key)
-                # 更新最后活动时间，避免重复触发
-                self.user_last_activity[user_key] = current_time
-                if self.enable_memory and self.data_storage:
-                    self.data_storage.save_user_last_activity(self.user_last_activity)
+            await self._send_auto_trigger_message(user_key)
+            # 更新最后活动时间和下次触发时间，避免重复触发
+            self.user_last_activity[user_key] = current_time
+            self._trigger_deadlines[user_key] = current_time + trigger_threshold
+            self._mark_dirty(self._dirty_activity, user_key)
                 
     async def _send_auto_trigger_message(self, user_key: str):
         """发送定时触发消息"""
@@ -475,20 +692,23 @@ class PluginDzmm(Star):
                 
         except Exception as e:
             logger.error(f"DZMM插件: 发送定时触发消息时发生错误: {str(e)}")
-            import traceback
             logger.error(traceback.format_exc())
 
-    def _sync_chat_with_ai(self, messages: List[dict], api_key: str) -> tuple[Optional[str], bool]:
-        """同步版本的AI聊天函数，支持完整的消息历史
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，不存在或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=100, limit_per_host=32, keepalive_timeout=75)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _async_chat_with_ai(self, messages: List[dict], api_key: str) -> tuple[Optional[str], bool]:
+        """异步版本的AI聊天函数，支持完整的消息历史
         
         Returns:
             tuple: (response_content, is_key_error)
             - response_content: AI的回复内容，失败时为None
             - is_key_error: 是否是API密钥相关的错误（如使用次数超限）
         """
-        import requests
-        import json
-
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
@@ -504,80 +724,78 @@ class PluginDzmm(Star):
             "repetition_penalty": self.repetition_penalty
         }
 
-        all_content_parts = []
+        # 增量累积回复内容，避免为每个片段保留一个字符串对象
+        content_buf = bytearray()
 
         try:
-            with requests.post(self.api_url, headers=headers, json=request_body, stream=True) as response:
+            async with self._get_session().post(self.api_url, headers=headers, json=request_body) as response:
                 # 检查HTTP状态码
-                if response.status_code == 401:
+                if response.status == 401:
                     logger.warning(f"DZMM插件: API密钥认证失败 (401)")
                     return None, True
-                elif response.status_code == 429:
+                elif response.status == 429:
                     logger.warning(f"DZMM插件: API使用次数超限 (429)")
                     return None, True
-                elif response.status_code == 403:
+                elif response.status == 403:
                     logger.warning(f"DZMM插件: API访问被拒绝 (403)")
                     return None, True
                 
                 response.raise_for_status()
 
-                for line_bytes in response.iter_lines():
-                    if line_bytes:
-                        decoded_line = line_bytes.decode('utf-8')
-
-                        if decoded_line.startswith('data: '):
-                            json_data_str = decoded_line[len('data: '):].strip()
-
-                            if not json_data_str:
-                                continue
-
-                            if json_data_str == "[DONE]":
-                                break
-
-                            try:
-                                json_data = json.loads(json_data_str)
-                                
-                                # 检查是否有错误信息
-                                if "error" in json_data:
-                                    error_info = json_data["error"]
-                                    error_code = error_info.get("code", "")
-                                    error_message = error_info.get("message", "")
-                                    
-                                    # 检查是否是密钥相关错误
-                                    if any(keyword in error_message.lower() for keyword in 
-                                          ["quota", "limit", "exceeded", "insufficient", "balance", "credit"]):
-                                        logger.warning(f"DZMM插件: API密钥使用限制错误: {error_message}")
-                                        return None, True
-                                    elif "invalid" in error_message.lower() and "key" in error_message.lower():
-                                        logger.warning(f"DZMM插件: API密钥无效错误: {error_message}")
-                                        return None, True
-                                    else:
-                                        logger.error(f"DZMM插件: API返回错误: {error_message}")
-                                        return None, True
-
-                                if json_data.get("completed"):
-                                    break
-
-                                choices = json_data.get("choices")
-                                if choices and len(choices) > 0:
-                                    delta = choices[0].get("delta")
-                                    if delta and delta.get("content"):
-                                        content_piece = delta["content"]
-                                        all_content_parts.append(content_piece)
-
-                            except json.JSONDecodeError:
-                                if json_data_str.strip():
-                                    logger.warning(f"DZMM插件: 解析JSON时出错: '{json_data_str}'")
-
-            if all_content_parts:
-                return "".join(all_content_parts), False
+                async for line_bytes in response.content:
+                    # 直接在字节上判断前缀，只处理data帧，跳过注释和空行
+                    line_bytes = line_bytes.strip()
+                    if not line_bytes.startswith(b'data: '):
+                        continue
+
+                    payload = line_bytes[6:].strip()
+                    if not payload:
+                        continue
+
+                    if payload == b"[DONE]":
+                        break
+
+                    try:
+                        json_data = _json_loads(payload)
+                    except json.JSONDecodeError:
+                        logger.warning(f"DZMM插件: 解析JSON时出错: '{payload.decode('utf-8', 'replace')}'")
+                        continue
+
+                    # 检查是否有错误信息
+                    if "error" in json_data:
+                        error_info = json_data["error"]
+                        error_code = error_info.get("code", "")
+                        error_message = error_info.get("message", "")
+                        
+                        # 检查是否是密钥相关错误
+                        if _KEY_ERROR_RE.search(error_message) is not None:
+                            logger.warning(f"DZMM插件: API密钥使用限制错误: {error_message}")
+                            return None, True
+                        elif _INVALID_KEY_RE.match(error_message) is not None:
+                            logger.warning(f"DZMM插件: API密钥无效错误: {error_message}")
+                            return None, True
+                        else:
+                            logger.error(f"DZMM插件: API返回错误: {error_message}")
+                            return None, True
+
+                    if json_data.get("completed"):
+                        break
+
+                    choices = json_data.get("choices")
+                    if choices and len(choices) > 0:
+                        delta = choices[0].get("delta")
+                        if delta and delta.get("content"):
+                            content_buf += delta["content"].encode("utf-8")
+
+            if content_buf:
+                return content_buf.decode("utf-8"), False
             else:
                 return None, False
 
-        except requests.exceptions.RequestException as e:
+        except aiohttp.ClientError as e:
             error_msg = str(e)
             # 检查是否是密钥相关的网络错误
-            if any(keyword in error_msg.lower() for keyword in ["401", "403", "429", "unauthorized", "forbidden"]):
+            if _NET_KEY_ERROR_RE.search(error_msg) is not None:
                 logger.error(f"DZMM插件: API密钥相关的请求错误: {error_msg}")
                 return None, True
             else:
@@ -596,7 +814,7 @@ class PluginDzmm(Star):
         current_retry = 0
         
         while current_retry < max_retries:
-            current_key_name = self.user_current_api_key[user_key]
+            current_key_name = self.user_current_api_key.get(user_key, "default")
             api_key = self.get_current_api_key(user_key)
             
             if not api_key:
@@ -608,25 +826,19 @@ class PluginDzmm(Star):
                 continue
 
             try:
-                # 在线程池中运行同步函数
-                loop = asyncio.get_event_loop()
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    result, is_key_error = await loop.run_in_executor(
-                        executor,
-                        lambda: self._sync_chat_with_ai(messages, api_key)
-                    )
+                result, is_key_error = await self._async_chat_with_ai(messages, api_key)
 
                 if result:
-                    # 成功获得回复，重置当前key的失败计数
-                    self.api_key_failures[current_key_name] = 0
-                    if self.enable_memory and self.data_storage:
-                        self.data_storage.save_api_key_failures(self.api_key_failures)
+                    # 成功获得回复，重置当前key的失败计数（只保留非零计数）
+                    if self.api_key_failures.pop(current_key_name, None) is not None:
+                        if self.enable_memory and self.data_storage:
+                            self.data_storage.save_api_key_failures(self.api_key_failures, current_key_name)
                     return result
                 elif is_key_error:
                     # 是密钥相关错误，增加失败计数并尝试切换key
-                    self.api_key_failures[current_key_name] += 1
+                    self.api_key_failures[current_key_name] = self.api_key_failures.get(current_key_name, 0) + 1
                     if self.enable_memory and self.data_storage:
-                        self.data_storage.save_api_key_failures(self.api_key_failures)
+                        self.data_storage.save_api_key_failure_one(current_key_name, self.api_key_failures[current_key_name])
                     logger.warning(f"DZMM插件: API密钥 '{current_key_name}' 失败次数: {self.api_key_failures[current_key_name]}")
                     
                     # 如果失败次数达到阈值，尝试切换key
@@ -645,9 +857,9 @@ class PluginDzmm(Star):
             except Exception as e:
                 logger.error(f"DZMM插件: 调用AI接口时发生错误: {str(e)}")
                 # 对于未知错误，也尝试切换key
-                self.api_key_failures[current_key_name] += 1
+                self.api_key_failures[current_key_name] = self.api_key_failures.get(current_key_name, 0) + 1
                 if self.enable_memory and self.data_storage:
-                    self.data_storage.save_api_key_failures(self.api_key_failures)
+                    self.data_storage.save_api_key_failure_one(current_key_name, self.api_key_failures[current_key_name])
                 if self.api_key_failures[current_key_name] >= self.max_failures_before_switch:
                     self.switch_to_next_key(user_key)
                 current_retry += 1
@@ -731,7 +943,10 @@ class PluginDzmm(Star):
             return
 
         if content.lower() == "clear":
-            self.user_contexts[user_key].clear()
+            context = self.user_contexts.get(user_key)
+            if context:
+                context.clear()
+                self._mark_dirty(self._dirty_users, user_key)
             yield event.plain_result("✅ 已清除聊天上下文")
             return
 
@@ -760,21 +975,25 @@ class PluginDzmm(Star):
             logger.error(f"DZMM插件: 处理聊天时发生错误: {str(e)}")
             yield event.plain_result(f"处理聊天时发生错误: {str(e)}")
 
+    def _reject_unknown(self, kind: str, name: str, available_label: str, available: str) -> str:
+        """记录名称不存在的警告，并返回提示可用选项的回复文本"""
+        logger.warning("DZMM插件: %s '%s' 不存在，%s: %s", kind, name, available_label, available)
+        return f"❌ {kind} '{name}' 不存在\n{available_label}：{available}"
+
     @command("dzmm_personas")
     async def dzmm_personas(self, event: AstrMessageEvent):
         """列出所有可用角色"""
         user_key = self.get_user_key(event)
 
         # 调试信息
-        logger.info(f"DZMM插件: 用户查询角色列表，当前有 {len(self.personas)} 个角色")
+        logger.info("DZMM插件: 用户查询角色列表，当前有 %d 个角色", len(self.personas))
 
         if not self.personas:
             yield event.plain_result("❌ 未配置任何角色，请检查配置")
             return
 
-        persona_list = "\n".join([f"• {name}" for name in self.personas.keys()])
-        current_persona = self.user_current_persona[user_key]
-        yield event.plain_result(f"可用角色列表（共{len(self.personas)}个）：\n{persona_list}\n\n当前使用角色：{current_persona}")
+        current_persona = self.user_current_persona.get(user_key, "default")
+        yield event.plain_result(f"可用角色列表（共{len(self.personas)}个）：\n{self._personas_bullets}\n\n当前使用角色：{current_persona}")
 
     @command("dzmm_persona")
     async def dzmm_persona(self, event: AstrMessageEvent, persona_name: str = None):
@@ -782,46 +1001,41 @@ class PluginDzmm(Star):
         user_key = self.get_user_key(event)
 
         if not persona_name or not persona_name.strip():
-            available_personas = ", ".join(self.personas.keys())
+            available_personas = self._personas_csv
             yield event.plain_result(f"请指定角色名称\n使用方法: /dzmm_persona [角色名]\n可用角色：{available_personas}")
             return
 
         persona_name = persona_name.strip()
-        logger.info(f"DZMM插件: 尝试切换到角色 '{persona_name}'")
+        logger.info("DZMM插件: 尝试切换到角色 '%s'", persona_name)
 
         if persona_name in self.personas:
             self.user_current_persona[user_key] = persona_name
             # 切换角色时清除上下文，避免角色混乱
-            self.user_contexts[user_key].clear()
+            context = self.user_contexts.get(user_key)
+            if context:
+                context.clear()
+                self._mark_dirty(self._dirty_users, user_key)
             
-            # 保存角色和上下文到存储（如果启用记忆功能）
-            if self.enable_memory and self.data_storage:
-                self.data_storage.save_user_current_persona(self.user_current_persona)
-                self.data_storage.save_user_contexts(self.user_contexts)
+            # 标记角色待保存
+            self._mark_dirty(self._dirty_persona, user_key)
             
-            logger.info(f"DZMM插件: 成功切换到角色 '{persona_name}'")
+            logger.info("DZMM插件: 成功切换到角色 '%s'", persona_name)
             yield event.plain_result(f"✅ 已切换到角色：{persona_name}\n\n💡 已自动清除聊天上下文以避免角色混乱")
         else:
-            available_personas = ", ".join(self.personas.keys())
-            logger.warning(f"DZMM插件: 角色 '{persona_name}' 不存在，可用角色: {available_personas}")
-            yield event.plain_result(f"❌ 角色 '{persona_name}' 不存在\n可用角色：{available_personas}")
+            yield event.plain_result(self._reject_unknown("角色", persona_name, "可用角色", self._personas_csv))
 
     @command("dzmm_keyls")
     async def dzmm_keyls(self, event: AstrMessageEvent):
         """列出所有API密钥及其使用状态"""
         user_key = self.get_user_key(event)
 
-        key_status_list = []
-        for name in self.api_keys.keys():
-            failure_count = self.api_key_failures.get(name, 0)
-            if failure_count < self.max_failures_before_switch:
-                status = f"🟢正常（失败次数：{failure_count}/{failure_count}）"
-            else:
-                status = f"🔴无效（失败次数：{failure_count}/{failure_count}）"
-            key_status_list.append(f"• {name} - {status}")
-        
-        key_list = "\n".join(key_status_list)
-        current_key = self.user_current_api_key[user_key]
+        max_failures = self.max_failures_before_switch
+        failures = self.api_key_failures
+        key_list = "\n".join(
+            f"• {name} - {'🟢正常' if count < max_failures else '🔴无效'}（失败次数：{count}/{max_failures}）"
+            for name, count in ((name, failures.get(name, 0)) for name in self._key_names)
+        )
+        current_key = self.user_current_api_key.get(user_key, "default")
         yield event.plain_result(f"API密钥状态列表：\n{key_list}\n\n当前使用密钥：{current_key}\n\n说明：失败{self.max_failures_before_switch}次后密钥将被禁用并自动切换下一个密钥。密钥将会在次日01:00重置为可用。")
 
     @command("dzmm_key")
@@ -830,26 +1044,23 @@ class PluginDzmm(Star):
         user_key = self.get_user_key(event)
 
         if not key_name or not key_name.strip():
-            available_keys = ", ".join(self.api_keys.keys())
+            available_keys = self._api_keys_csv
             yield event.plain_result(f"请指定API密钥名称\n使用方法: /dzmm_key [密钥名]\n可用密钥：{available_keys}")
             return
 
         key_name = key_name.strip()
-        logger.info(f"DZMM插件: 尝试切换到API密钥 '{key_name}'")
+        logger.info("DZMM插件: 尝试切换到API密钥 '%s'", key_name)
 
         if key_name in self.api_keys:
             self.user_current_api_key[user_key] = key_name
             
-            # 保存用户当前API密钥到存储（如果启用记忆功能）
-            if self.enable_memory and self.data_storage:
-                self.data_storage.save_user_current_api_key(self.user_current_api_key)
+            # 标记用户当前API密钥待保存
+            self._mark_dirty(self._dirty_api_key, user_key)
             
-            logger.info(f"DZMM插件: 成功切换到API密钥 '{key_name}'")
+            logger.info("DZMM插件: 成功切换到API密钥 '%s'", key_name)
             yield event.plain_result(f"✅ 已切换到API密钥：{key_name}")
         else:
-            available_keys = ", ".join(self.api_keys.keys())
-            logger.warning(f"DZMM插件: API密钥 '{key_name}' 不存在，可用密钥: {available_keys}")
-            yield event.plain_result(f"❌ API密钥 '{key_name}' 不存在\n可用密钥：{available_keys}")
+            yield event.plain_result(self._reject_unknown("API密钥", key_name, "可用密钥", self._api_keys_csv))
 
     @command("dzmm_status")
     async def dzmm_status(self, event: AstrMessageEvent):
@@ -857,43 +1068,35 @@ class PluginDzmm(Star):
         user_key = self.get_user_key(event)
         nickname = self.get_user_nickname(event)
 
-        current_persona = self.user_current_persona[user_key]
-        current_key = self.user_current_api_key[user_key]
-        context_count = len(self.user_contexts[user_key])
+        current_persona = self.user_current_persona.get(user_key, "default")
+        current_key = self.user_current_api_key.get(user_key, "default")
+        context_count = len(self.user_contexts.get(user_key, ()))
 
         # 判断聊天模式
         group_id = event.get_group_id()
-
-        if group_id and group_id != "private":
-            if self.group_shared_context:
-                chat_mode = "群聊模式（共享上下文）"
-            else:
-                chat_mode = "群聊模式（独立上下文）"
-        else:
-            chat_mode = "私聊模式"
-
-        nickname_status = "启用" if self.show_nickname else "禁用"
-
-        yield event.plain_result(
-            f"当前状态：\n"
-            f"• 聊天模式：{chat_mode}\n"
-            f"• 当前用户：{nickname}\n"
-            f"• 昵称显示：{nickname_status}\n"
-            f"• 使用角色：{current_persona}\n"
-            f"• 使用API密钥：{current_key}\n"
-            f"• 上下文消息数：{context_count}/{self.context_length}"
-        )
+        chat_mode = self._mode_strs[bool(group_id) and group_id != "private"]
+        nickname_status = self._nick_strs[bool(self.show_nickname)]
+
+        yield event.plain_result(self._STATUS_TPL.format(
+            mode=chat_mode,
+            nick=nickname,
+            nick_status=nickname_status,
+            persona=current_persona,
+            key=current_key,
+            count=context_count,
+            length=self.context_length,
+        ))
 
     @command("dzmm_clear")
     async def dzmm_clear(self, event: AstrMessageEvent):
         """清除聊天上下文"""
         user_key = self.get_user_key(event)
 
-        self.user_contexts[user_key].clear()
-        
-        # 保存清除后的上下文到存储（如果启用记忆功能）
-        if self.enable_memory and self.data_storage:
-            self.data_storage.save_user_contexts(self.user_contexts)
+        # 上下文本来为空时无需保存
+        context = self.user_contexts.get(user_key)
+        if context:
+            context.clear()
+            self._mark_dirty(self._dirty_users, user_key)
         
         yield event.plain_result("✅ 已清除聊天上下文")
     
@@ -926,36 +1129,33 @@ class PluginDzmm(Star):
             return
         
         # 检查白名单状态
-        in_whitelist = user_id in self.auto_trigger_whitelist if self.auto_trigger_whitelist else False
+        in_whitelist = user_id in self.auto_trigger_whitelist
         whitelist_status = "✅ 已加入" if in_whitelist else "❌ 未加入"
         
         # 获取最后活动时间
+        interval = self.auto_trigger_interval
         last_activity = self.user_last_activity.get(user_key)
         if last_activity:
-            last_activity_str = datetime.fromtimestamp(last_activity).strftime("%Y-%m-%d %H:%M:%S")
-            minutes_since = (datetime.now().timestamp() - last_activity) / 60
-            next_trigger_minutes = max(0, self.auto_trigger_interval - minutes_since)
+            last_activity_str = _fmt_ts(int(last_activity))
+            minutes_since = (time.time() - last_activity) / 60
+            next_trigger_minutes = interval - minutes_since if minutes_since < interval else 0.0
         else:
-            last_activity_str = "无记录"
-            next_trigger_minutes = 0
-        
-        yield event.plain_result(
-            f"定时触发功能状态：\n"
-            f"• 功能状态：✅ 已启用\n"
-            f"• 触发间隔：{self.auto_trigger_interval}分钟\n"
-            f"• 白名单状态：{whitelist_status}\n"
-            f"• 最后活动时间：{last_activity_str}\n"
-            f"• 下次触发时间：{next_trigger_minutes:.1f}分钟后\n"
-            f"• 触发消息：{self.auto_trigger_message}\n\n"
-            f"💡 只有私聊且在白名单中的用户才会收到定时触发消息"
-        )
+            last_activity_str, next_trigger_minutes = "无记录", 0.0
+        
+        yield event.plain_result(self._TRIGGER_TPL.format(
+            interval=interval,
+            whitelist=whitelist_status,
+            last_activity=last_activity_str,
+            next_minutes=next_trigger_minutes,
+            message=self.auto_trigger_message,
+        ))
 
     async def terminate(self):
         """插件卸载/停用时调用，用于清理资源"""
         logger.info("DZMM插件: 开始清理资源...")
         
         # 取消定时触发任务
-        if hasattr(self, 'auto_trigger_task') and self.auto_trigger_task and not self.auto_trigger_task.done():
+        if self.auto_trigger_task and not self.auto_trigger_task.done():
             self.auto_trigger_task.cancel()
             try:
                 await self.auto_trigger_task
@@ -964,35 +1164,34 @@ class PluginDzmm(Star):
             except Exception as e:
                 logger.error(f"DZMM插件: 取消定时触发任务时发生错误: {str(e)}")
         
-        # 保存所有数据（如果启用记忆功能）
-        if hasattr(self, 'enable_memory') and self.enable_memory and hasattr(self, 'data_storage') and self.data_storage:
+        # 取消每日重置任务
+        if self._reset_task and not self._reset_task.done():
+            self._reset_task.cancel()
             try:
-                self.data_storage.save_all_data(
-                    self.user_contexts,
-                    self.user_current_persona,
-                    self.user_current_api_key,
-                    self.api_key_failures,
-                    user_last_activity=self.user_last_activity
-                )
-                logger.info("DZMM插件: 已保存所有数据")
-            except Exception as e:
-                logger.error(f"DZMM插件: 保存数据时发生错误: {str(e)}")
+                await self._reset_task
+            except asyncio.CancelledError:
+                pass
         
-        logger.info("DZMM插件: 资源清理完成")
-
-    def __del__(self):
-        """析构函数，确保数据被保存并清理资源"""
-        logger.info("DZMM插件: 开始清理资源...")
+        # 取消批量保存任务，剩余修改由下面的完整保存写入
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
         
-        # 取消定时触发任务
-        if hasattr(self, 'auto_trigger_task') and self.auto_trigger_task and not self.auto_trigger_task.done():
-            self.auto_trigger_task.cancel()
-            logger.info("DZMM插件: 定时触发任务已取消")
+        # 等待写入线程处理完队列中剩余的任务后退出
+        if self._writer_thread is not None:
+            self._write_queue.put(None)
+            await asyncio.to_thread(self._writer_thread.join, 10)
         
         # 保存所有数据（如果启用记忆功能）
-        if hasattr(self, 'enable_memory') and self.enable_memory and hasattr(self, 'data_storage') and self.data_storage:
+        if self.enable_memory and self.data_storage:
+            self._clear_dirty()
+            # 保存和关闭都会等待磁盘写入，放到线程中执行以免阻塞事件循环
             try:
-                self.data_storage.save_all_data(
+                await asyncio.to_thread(
+                    self.data_storage.save_all_data,
                     self.user_contexts,
                     self.user_current_persona,
                     self.user_current_api_key,
@@ -1002,5 +1201,12 @@ class PluginDzmm(Star):
                 logger.info("DZMM插件: 已保存所有数据")
             except Exception as e:
                 logger.error(f"DZMM插件: 保存数据时发生错误: {str(e)}")
+            
+            # 停止数据存储的后台线程，避免重载插件后与新实例同时写入
+            await asyncio.to_thread(self.data_storage.close)
+        
+        # 关闭共享的HTTP会话
+        if self._session and not self._session.closed:
+            await self._session.close()
         
         logger.info("DZMM插件: 资源清理完成")